@@ -5,18 +5,45 @@ Provides tools to view and manage the SQLite database
 """
 
 import argparse
+import functools
+import shutil
 import sqlite3
+import subprocess
 import sys
 from pathlib import Path
+from typing import Optional
 
 
-def connect_db(db_path: str = "/var/lib/rfid_reader/card_reads.db"):
-    """Connect to the database"""
-    if not Path(db_path).exists():
-        print(f"Database not found: {db_path}")
-        sys.exit(1)
-    
-    return sqlite3.connect(db_path)
+@functools.lru_cache(maxsize=4)
+def connect_db(db_path: str = "/var/lib/rfid_reader/card_reads.db", optimize: bool = True):
+    """Connect to the database
+    
+    Connections are cached per path so repeated calls (e.g. from a monitoring
+    loop) reuse the same connection and its prepared statement cache. With
+    optimize set, the connection uses WAL and synchronous=NORMAL so commits
+    don't fsync on every write.
+    """
+    # Open read-write without create, so a missing database fails here instead
+    # of needing a separate existence check
+    try:
+        conn = sqlite3.connect(f"{Path(db_path).absolute().as_uri()}?mode=rw", uri=True, 
+                               cached_statements=256, check_same_thread=False)
+    except sqlite3.OperationalError:
+        # Only a missing file gets the friendly message; anything else (permissions,
+        # a directory) is reported by main() with SQLite's own error
+        if not Path(db_path).exists():
+            print(f"Database not found: {db_path}")
+            sys.exit(1)
+        raise
+    
+    if optimize:
+        # journal_mode is persistent in the database file, so only switch it once
+        if conn.execute("PRAGMA journal_mode").fetchone()[0] != 'wal':
+            conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA temp_store = MEMORY")
+    
+    return conn
 
 def show_stats(db_path: str):
     """Show database statistics"""
@@ -25,43 +52,34 @@ def show_stats(db_path: str):
     
     print("=== RFID Reader Database Statistics ===")
     
-    # Total records
-    cursor.execute("SELECT COUNT(*) FROM card_reads")
-    total = cursor.fetchone()[0]
-    print(f"Total records: {total}")
-    
-    # Sync status breakdown
+    # Gather every statistic in a single pass over the table
     cursor.execute("""
-        SELECT sync_status, COUNT(*) 
+        SELECT sync_status, 
+               COUNT(*),
+               SUM(CASE WHEN created_at >= datetime('now', '-1 hour') THEN 1 ELSE 0 END),
+               SUM(CASE WHEN sync_status = 'pending' AND sync_attempts > 0 THEN 1 ELSE 0 END)
         FROM card_reads 
         GROUP BY sync_status
     """)
-    status_counts = cursor.fetchall()
+    rows = cursor.fetchall()
+    
+    # Total records
+    total = sum(row[1] for row in rows)
+    print(f"Total records: {total}")
     
+    # Sync status breakdown
     print("\nSync Status Breakdown:")
-    for status, count in status_counts:
+    for status, count, _, _ in rows:
         percentage = (count / total * 100) if total > 0 else 0
         print(f"  {status}: {count} ({percentage:.1f}%)")
     
     # Recent activity
-    cursor.execute("""
-        SELECT COUNT(*) 
-        FROM card_reads 
-        WHERE created_at >= datetime('now', '-1 hour')
-    """)
-    recent = cursor.fetchone()[0]
+    recent = sum(row[2] for row in rows)
     print(f"\nRecords in last hour: {recent}")
     
     # Failed syncs
-    cursor.execute("""
-        SELECT COUNT(*) 
-        FROM card_reads 
-        WHERE sync_status = 'pending' AND sync_attempts > 0
-    """)
-    failed = cursor.fetchone()[0]
+    failed = sum(row[3] for row in rows)
     print(f"Failed syncs (with attempts): {failed}")
-    
-    conn.close()
 
 def show_recent(db_path: str, limit: int = 20):
     """Show recent card reads"""
@@ -71,7 +89,10 @@ def show_recent(db_path: str, limit: int = 20):
     print(f"=== Recent Card Reads (Last {limit}) ===")
     
     cursor.execute("""
-        SELECT id, device_id, card_id, card_value, timestamp, sync_status, sync_attempts, created_at
+        SELECT id, 
+               substr(card_id, 1, 14) || CASE WHEN length(card_id) > 14 THEN '...' ELSE '' END,
+               substr(card_value, 1, 19) || CASE WHEN length(card_value) > 19 THEN '...' ELSE '' END,
+               sync_status, sync_attempts, created_at
         FROM card_reads 
         ORDER BY created_at DESC 
         LIMIT ?
@@ -83,17 +104,12 @@ def show_recent(db_path: str, limit: int = 20):
         print("No records found.")
         return
     
-    print(f"{'ID':<5} {'Card ID':<15} {'Card Value':<20} {'Status':<10} {'Attempts':<10} {'Created':<20}")
-    print("-" * 85)
+    row_format = "{:<5} {:<15} {:<20} {:<10} {:<10} {:<20}\n".format
     
-    for record in records:
-        row_id, device_id, card_id, card_value, timestamp, sync_status, attempts, created_at = record
-        # Truncate long values for display
-        display_card_id = card_id[:14] + "..." if len(card_id) > 14 else card_id
-        display_card_value = card_value[:19] + "..." if len(card_value) > 19 else card_value
-        print(f"{row_id:<5} {display_card_id:<15} {display_card_value:<20} {sync_status:<10} {attempts:<10} {created_at:<20}")
+    sys.stdout.write(row_format('ID', 'Card ID', 'Card Value', 'Status', 'Attempts', 'Created'))
+    print("-" * 85)
     
-    conn.close()
+    sys.stdout.writelines(row_format(*record) for record in records)
 
 def show_pending(db_path: str):
     """Show pending syncs"""
@@ -103,7 +119,12 @@ def show_pending(db_path: str):
     print("=== Pending Syncs ===")
     
     cursor.execute("""
-        SELECT id, card_id, card_value, sync_attempts, last_sync_attempt, next_retry, created_at
+        SELECT id, 
+               substr(card_id, 1, 14) || CASE WHEN length(card_id) > 14 THEN '...' ELSE '' END,
+               substr(card_value, 1, 19) || CASE WHEN length(card_value) > 19 THEN '...' ELSE '' END,
+               sync_attempts, 
+               COALESCE(last_sync_attempt, 'Never'), 
+               COALESCE(next_retry, 'Now')
         FROM card_reads 
         WHERE sync_status = 'pending'
         ORDER BY created_at ASC
@@ -115,19 +136,12 @@ def show_pending(db_path: str):
         print("No pending syncs found.")
         return
     
-    print(f"{'ID':<5} {'Card ID':<15} {'Card Value':<20} {'Attempts':<10} {'Last Attempt':<20} {'Next Retry':<20}")
-    print("-" * 95)
+    row_format = "{:<5} {:<15} {:<20} {:<10} {:<20} {:<20}\n".format
     
-    for record in records:
-        row_id, card_id, card_value, attempts, last_attempt, next_retry, created_at = record
-        last_attempt_str = last_attempt if last_attempt else "Never"
-        next_retry_str = next_retry if next_retry else "Now"
-        # Truncate long values for display
-        display_card_id = card_id[:14] + "..." if len(card_id) > 14 else card_id
-        display_card_value = card_value[:19] + "..." if len(card_value) > 19 else card_value
-        print(f"{row_id:<5} {display_card_id:<15} {display_card_value:<20} {attempts:<10} {last_attempt_str:<20} {next_retry_str:<20}")
+    sys.stdout.write(row_format('ID', 'Card ID', 'Card Value', 'Attempts', 'Last Attempt', 'Next Retry'))
+    print("-" * 95)
     
-    conn.close()
+    sys.stdout.writelines(row_format(*record) for record in records)
 
 def retry_failed(db_path: str):
     """Reset failed syncs to retry immediately"""
@@ -142,41 +156,76 @@ def retry_failed(db_path: str):
     
     affected = cursor.rowcount
     conn.commit()
-    conn.close()
     
     print(f"Reset {affected} pending records to retry immediately.")
 
 def cleanup_old(db_path: str, days: int = 30):
     """Clean up old successful records"""
     conn = connect_db(db_path)
-    cursor = conn.cursor()
     
-    # Count records to be deleted
-    cursor.execute("""
-        SELECT COUNT(*) 
-        FROM card_reads 
-        WHERE sync_status = 'success' 
-        AND created_at < datetime('now', '-{} days')
-    """.format(days))
+    # Delete old successful records, using the row count instead of a separate COUNT(*) scan
+    with conn:
+        cursor = conn.execute("""
+            DELETE FROM card_reads 
+            WHERE sync_status = 'success' 
+            AND created_at < datetime('now', ?)
+        """, (f'-{days} days',))
     
-    count = cursor.fetchone()[0]
+    count = cursor.rowcount
     
     if count == 0:
         print("No old successful records to clean up.")
         return
     
-    # Delete old successful records
-    cursor.execute("""
-        DELETE FROM card_reads 
-        WHERE sync_status = 'success' 
-        AND created_at < datetime('now', '-{} days')
-    """.format(days))
-    
-    conn.commit()
-    conn.close()
-    
     print(f"Cleaned up {count} old successful records (older than {days} days).")
 
+EXPORT_COLUMNS = [
+    ('device_id', 'Device ID'),
+    ('card_id', 'Card ID'),
+    ('card_value', 'Card Value'),
+    ('timestamp', 'Timestamp'),
+    ('sync_status', 'Sync Status'),
+    ('sync_attempts', 'Sync Attempts'),
+    ('last_sync_attempt', 'Last Sync Attempt'),
+    ('created_at', 'Created At'),
+]
+
+# Built once so every export issues the identical SQL text
+EXPORT_QUERY = "SELECT {} FROM card_reads ORDER BY created_at DESC".format(
+    ", ".join(column for column, _ in EXPORT_COLUMNS)
+)
+EXPORT_CLI_QUERY = "SELECT {} FROM card_reads ORDER BY created_at DESC;".format(
+    ", ".join(f'{column} AS "{header}"' for column, header in EXPORT_COLUMNS)
+)
+
+def export_data_cli(db_path: str, output_file: str) -> Optional[int]:
+    """Export data to CSV using the sqlite3 command line shell
+    
+    Returns the number of exported records, or None if the shell is unavailable
+    or the export failed, so the caller can fall back to the Python CSV writer.
+    """
+    sqlite3_cli = shutil.which("sqlite3")
+    if not sqlite3_cli:
+        return None
+    
+    # The count is read in the same transaction as the export so both see one
+    # snapshot. It comes first so the rest of the output can be streamed straight
+    # to the file; the path is never passed to the shell, which would unescape it
+    process = subprocess.Popen(
+        [sqlite3_cli, "-readonly", db_path, ".mode csv",
+         "BEGIN;", "SELECT count(*) FROM card_reads;", ".headers on", EXPORT_CLI_QUERY, "COMMIT;"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    with process:
+        count_line = process.stdout.readline()
+        with open(output_file, 'wb') as csvfile:
+            shutil.copyfileobj(process.stdout, csvfile, 1024 * 1024)
+        errors = process.stderr.read()
+    
+    if process.returncode != 0 or errors or not count_line.strip().isdigit():
+        return None
+    return int(count_line)
+
 def export_data(db_path: str, output_file: str):
     """Export data to CSV"""
     import csv
@@ -184,23 +233,54 @@ def export_data(db_path: str, output_file: str):
     conn = connect_db(db_path)
     cursor = conn.cursor()
     
-    cursor.execute("""
-        SELECT device_id, card_id, card_value, timestamp, sync_status, sync_attempts, 
-               last_sync_attempt, created_at
-        FROM card_reads 
-        ORDER BY created_at DESC
-    """)
+    # The sqlite3 shell formats rows in C, which is much faster than csv.writer
+    count = export_data_cli(db_path, output_file)
+    if count is not None:
+        print(f"Exported {count} records to {output_file}")
+        return
     
-    records = cursor.fetchall()
-    conn.close()
+    # Let SQLite keep more pages in memory and map the file for the full scan
+    cursor.execute("PRAGMA cache_size = -65536")
+    cursor.execute("PRAGMA mmap_size = 268435456")
+    
+    cursor.execute(EXPORT_QUERY)
     
+    count = 0
     with open(output_file, 'w', newline='') as csvfile:
         writer = csv.writer(csvfile)
-        writer.writerow(['Device ID', 'Card ID', 'Card Value', 'Timestamp', 'Sync Status', 
-                        'Sync Attempts', 'Last Sync Attempt', 'Created At'])
-        writer.writerows(records)
+        writer.writerow([header for _, header in EXPORT_COLUMNS])
+        
+        # Stream rows in batches so memory stays bounded on large databases
+        while True:
+            batch = cursor.fetchmany(10000)
+            if not batch:
+                break
+            writer.writerows(batch)
+            count += len(batch)
+    
+    print(f"Exported {count} records to {output_file}")
+
+def export_sql(db_path: str, output_file: str):
+    """Export the whole database as an SQL dump"""
+    conn = connect_db(db_path)
+    
+    with open(output_file, 'w') as sqlfile:
+        sqlfile.writelines(f"{line}\n" for line in conn.iterdump())
+    
+    print(f"Exported SQL dump to {output_file}")
+
+def export_backup(db_path: str, output_file: str):
+    """Copy the whole database to a new SQLite file using the online backup API"""
+    conn = connect_db(db_path)
+    
+    backup_conn = sqlite3.connect(output_file)
+    try:
+        # Copy in chunks of pages so writers are not blocked for the whole backup
+        conn.backup(backup_conn, pages=1024)
+    finally:
+        backup_conn.close()
     
-    print(f"Exported {len(records)} records to {output_file}")
+    print(f"Backed up database to {output_file}")
 
 def main():
     parser = argparse.ArgumentParser(description="RFID Reader Database Manager")
@@ -229,8 +309,12 @@ def main():
                                help='Delete records older than N days')
     
     # Export command
-    export_parser = subparsers.add_parser('export', help='Export data to CSV')
-    export_parser.add_argument('output', help='Output CSV file path')
+    export_parser = subparsers.add_parser('export', help='Export data to CSV, an SQL dump or a database backup')
+    export_parser.add_argument('output', help='Output file path')
+    export_parser.add_argument('--format', choices=['csv', 'sql', 'backup'], default='csv', 
+                              help='Export format (default: csv). CSV is written by the sqlite3 '
+                                   'shell when installed, which also quotes values containing '
+                                   'spaces; the Python fallback quotes only where required')
     
     args = parser.parse_args()
     
@@ -250,7 +334,12 @@ def main():
         elif args.command == 'cleanup':
             cleanup_old(args.db, args.days)
         elif args.command == 'export':
-            export_data(args.db, args.output)
+            if args.format == 'sql':
+                export_sql(args.db, args.output)
+            elif args.format == 'backup':
+                export_backup(args.db, args.output)
+            else:
+                export_data(args.db, args.output)
     
     except Exception as e:
         print(f"Error: {e}")
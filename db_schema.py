@@ -0,0 +1,28 @@
+"""
+Shared database schema for the RFID reader
+Used by rfid_reader.py for new databases and migrate_db.py for existing ones
+"""
+
+import sqlite3
+
+def create_indexes(cursor: sqlite3.Cursor):
+    """Create the indexes used by the reader and the database manager queries"""
+    # Superseded by idx_status_created, which the planner picks for every status
+    # query; an unused index still costs a B-tree write per insert and update
+    cursor.execute('DROP INDEX IF EXISTS idx_sync_status')
+    cursor.execute('DROP INDEX IF EXISTS idx_next_retry')
+    cursor.execute('DROP INDEX IF EXISTS idx_pending')
+    cursor.execute('DROP INDEX IF EXISTS idx_failed_pending')
+    
+    # Status filters ordered or bounded by creation time (reader sync query,
+    # stats, pending, cleanup)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_status_created
+        ON card_reads(sync_status, created_at)
+    ''')
+    
+    # Newest-first listings (recent reads and the CSV export)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_created_at
+        ON card_reads(created_at)
+    ''')
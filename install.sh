@@ -67,6 +67,7 @@ cp db_manager.py /usr/local/bin/
 cp diagnose.py /usr/local/bin/
 cp fix_spi.sh /usr/local/bin/
 cp migrate_db.py /usr/local/bin/
+cp db_schema.py /usr/local/bin/
 chmod +x /usr/local/bin/rfid_reader.py
 chmod +x /usr/local/bin/db_manager.py
 chmod +x /usr/local/bin/diagnose.py
@@ -7,8 +7,11 @@ Migrates from old schema (card_value only) to new schema (card_id + card_value)
 import logging
 import sqlite3
 import sys
+from contextlib import closing
 from pathlib import Path
 
+from db_schema import create_indexes
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -19,7 +22,8 @@ logger = logging.getLogger(__name__)
 def check_schema_version(db_path: str) -> str:
     """Check the current schema version of the database"""
     try:
-        with sqlite3.connect(db_path) as conn:
+        # closing() so no connection (and its WAL read lock) outlives the check
+        with closing(sqlite3.connect(db_path)) as conn:
             cursor = conn.cursor()
             
             # Check if card_id column exists
@@ -35,15 +39,27 @@ def check_schema_version(db_path: str) -> str:
         logger.error(f"Error checking schema: {e}")
         return "unknown"
 
+def ensure_indexes(db_path: str):
+    """Add any missing indexes to a database that already has the new schema"""
+    try:
+        with closing(sqlite3.connect(db_path)) as conn:
+            create_indexes(conn.cursor())
+            conn.commit()
+            logger.info("Database indexes are up to date")
+    except Exception as e:
+        logger.error(f"Error creating indexes: {e}")
+        raise
+
 def migrate_database(db_path: str):
     """Migrate database from old schema to new schema"""
     try:
-        with sqlite3.connect(db_path) as conn:
+        # Check current schema before opening the migration connection
+        schema_version = check_schema_version(db_path)
+        
+        # Autocommit mode so the migration transaction is controlled explicitly below
+        with closing(sqlite3.connect(db_path, isolation_level=None)) as conn:
             cursor = conn.cursor()
             
-            # Check current schema
-            schema_version = check_schema_version(db_path)
-            
             if schema_version == "new":
                 logger.info("Database already has new schema (card_id + card_value)")
                 return
@@ -54,55 +70,59 @@ def migrate_database(db_path: str):
             
             logger.info("Migrating database from old schema to new schema...")
             
-            # Create new table with new schema
-            cursor.execute('''
-                CREATE TABLE card_reads_new (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    device_id TEXT NOT NULL,
-                    card_id TEXT NOT NULL,
-                    card_value TEXT NOT NULL,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    sync_status TEXT DEFAULT 'pending',
-                    sync_attempts INTEGER DEFAULT 0,
-                    last_sync_attempt DATETIME,
-                    next_retry DATETIME,
-                    webhook_response TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+            # Speed up the one-shot bulk copy with a larger page cache. The journal
+            # and fsyncs are left as they are: the table swap drops the only copy of
+            # the data, so a power loss mid-migration must still roll back cleanly
+            cursor.execute('PRAGMA temp_store = MEMORY')
+            cursor.execute('PRAGMA cache_size = -262144')
             
-            # Copy data from old table to new table
-            # In the old schema, card_value contained the card ID
-            # In the new schema, we'll use the old card_value as card_id and set card_value to empty
-            cursor.execute('''
-                INSERT INTO card_reads_new (
-                    id, device_id, card_id, card_value, timestamp, 
-                    sync_status, sync_attempts, last_sync_attempt, next_retry, 
-                    webhook_response, created_at
-                )
-                SELECT 
-                    id, device_id, card_value, '', timestamp,
-                    sync_status, sync_attempts, last_sync_attempt, next_retry,
-                    webhook_response, created_at
-                FROM card_reads
-            ''')
-            
-            # Drop old table and rename new table
-            cursor.execute('DROP TABLE card_reads')
-            cursor.execute('ALTER TABLE card_reads_new RENAME TO card_reads')
-            
-            # Create indexes
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_sync_status 
-                ON card_reads(sync_status)
-            ''')
-            
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_next_retry 
-                ON card_reads(next_retry)
-            ''')
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                # Create new table with new schema
+                cursor.execute('''
+                    CREATE TABLE card_reads_new (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        device_id TEXT NOT NULL,
+                        card_id TEXT NOT NULL,
+                        card_value TEXT NOT NULL,
+                        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        sync_status TEXT DEFAULT 'pending',
+                        sync_attempts INTEGER DEFAULT 0,
+                        last_sync_attempt DATETIME,
+                        next_retry DATETIME,
+                        webhook_response TEXT,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                
+                # Copy data from old table to new table
+                # In the old schema, card_value contained the card ID
+                # In the new schema, we'll use the old card_value as card_id and set card_value to empty
+                cursor.execute('''
+                    INSERT INTO card_reads_new (
+                        id, device_id, card_id, card_value, timestamp, 
+                        sync_status, sync_attempts, last_sync_attempt, next_retry, 
+                        webhook_response, created_at
+                    )
+                    SELECT 
+                        id, device_id, card_value, '', timestamp,
+                        sync_status, sync_attempts, last_sync_attempt, next_retry,
+                        webhook_response, created_at
+                    FROM card_reads
+                ''')
+                
+                # Drop old table and rename new table
+                cursor.execute('DROP TABLE card_reads')
+                cursor.execute('ALTER TABLE card_reads_new RENAME TO card_reads')
+                
+                # Create indexes
+                create_indexes(cursor)
+                
+                cursor.execute('COMMIT')
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
             
-            conn.commit()
             logger.info("Database migration completed successfully!")
             
     except Exception as e:
@@ -123,6 +143,7 @@ def main():
         
         if schema_version == "new":
             logger.info("Database already has the new schema")
+            ensure_indexes(db_path)
         elif schema_version == "old":
             logger.info("Database has old schema, migrating...")
             migrate_database(db_path)
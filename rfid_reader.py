@@ -4,19 +4,26 @@ RFID Reader for Raspberry Pi
 Reads RFID cards using RC522 module and sends data to webhook
 """
 
-import hashlib
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import secrets
+import signal
 import sqlite3
 import subprocess
 import sys
 import threading
 import time
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Optional, Tuple
 
 import requests
 import tomllib
+from requests.adapters import HTTPAdapter
+
+from db_schema import create_indexes
 
 try:
     import RPi.GPIO as GPIO
@@ -26,22 +33,73 @@ except ImportError as e:
     print(f"Import error: {e}")
     sys.exit(1)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/var/log/rfid_reader.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+def configure_logging():
+    """Send log records through a queue to a listener thread that writes them
+    
+    Called from main() only, so importing this module (e.g. from diagnose.py)
+    leaves the importer's logging setup alone. File and console I/O stay off
+    the card reading and sync threads.
+    """
+    log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    log_file_handler = logging.handlers.RotatingFileHandler(
+        '/var/log/rfid_reader.log', maxBytes=1_000_000, backupCount=3, delay=True
+    )
+    log_file_handler.setFormatter(log_formatter)
+    log_stream_handler = logging.StreamHandler()
+    log_stream_handler.setFormatter(log_formatter)
+    
+    log_queue = queue.Queue(-1)
+    log_listener = logging.handlers.QueueListener(log_queue, log_file_handler, log_stream_handler)
+    log_listener.start()
+    atexit.register(log_listener.stop)  # Flush queued records on exit
+    
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+# Statements on the hot path are kept as constants so every call sends identical
+# SQL text and is served from the connection's prepared statement cache
+INSERT_CARD_READ_SQL = '''
+    INSERT INTO card_reads (device_id, card_id, card_value, next_retry)
+    VALUES (?, ?, ?, datetime('now'))
+'''
+
+UPDATE_SYNC_SUCCESS_SQL = '''
+    UPDATE card_reads 
+    SET sync_status = ?, webhook_response = ?, last_sync_attempt = datetime('now')
+    WHERE id = ?
+'''
+
+UPDATE_SYNC_RETRY_SQL = '''
+    UPDATE card_reads 
+    SET sync_status = ?, sync_attempts = ?, last_sync_attempt = datetime('now'), 
+        next_retry = datetime('now', ?), webhook_response = ?
+    WHERE id = ?
+'''
+
+SELECT_PENDING_SYNCS_SQL = '''
+    SELECT id, device_id, card_id, card_value, timestamp, sync_attempts, last_sync_attempt
+    FROM card_reads 
+    WHERE sync_status = 'pending' 
+    AND (next_retry IS NULL OR next_retry <= datetime('now'))
+    AND created_at >= datetime('now', ?)
+    ORDER BY created_at ASC
+    LIMIT ?
+'''
+
+# Larger pages mean fewer, more sequential writes on the SD card
+DB_PAGE_SIZE = 8192
+
 class DatabaseManager:
     def __init__(self, db_path: str = "/var/lib/rfid_reader/card_reads.db"):
         self.db_path = db_path
+        self.lock = threading.Lock()
         self.ensure_db_directory()
+        self.conn = self.connect()
         self.init_database()
+        self.upgrade_page_size()
     
     def ensure_db_directory(self):
         """Ensure the database directory exists"""
@@ -53,11 +111,36 @@ class DatabaseManager:
             logger.error(f"Error creating database directory: {e}")
             raise
     
+    def connect(self) -> sqlite3.Connection:
+        """Open the long-lived connection shared by the reader and sync threads"""
+        try:
+            conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False, 
+                                   cached_statements=256)
+            
+            # Only takes effect for a new database, so it must come before anything is written
+            conn.execute(f'PRAGMA page_size={DB_PAGE_SIZE}')
+            
+            # WAL with synchronous=NORMAL only fsyncs on checkpoint instead of on every commit
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA wal_autocheckpoint=1000')
+            conn.execute('PRAGMA cache_spill=OFF')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            conn.execute('PRAGMA mmap_size=67108864')
+            conn.execute('PRAGMA cache_size=-8000')
+            conn.execute('PRAGMA busy_timeout=5000')
+            
+            logger.info(f"Database connection opened: {self.db_path}")
+            return conn
+        except Exception as e:
+            logger.error(f"Error opening database connection: {e}")
+            raise
+    
     def init_database(self):
         """Initialize the database with required tables"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
+            with self.lock:
+                cursor = self.conn.cursor()
                 
                 # Create card_reads table
                 cursor.execute('''
@@ -76,99 +159,120 @@ class DatabaseManager:
                     )
                 ''')
                 
-                # Create index for efficient querying
-                cursor.execute('''
-                    CREATE INDEX IF NOT EXISTS idx_sync_status 
-                    ON card_reads(sync_status)
-                ''')
+                # Same indexes as migrate_db.py, so fresh installs match upgraded ones
+                create_indexes(cursor)
                 
-                cursor.execute('''
-                    CREATE INDEX IF NOT EXISTS idx_next_retry 
-                    ON card_reads(next_retry)
-                ''')
+                # Collect planner statistics so the partial index is chosen as the table grows
+                cursor.execute('ANALYZE')
                 
-                conn.commit()
                 logger.info(f"Database initialized: {self.db_path}")
                 
         except Exception as e:
             logger.error(f"Error initializing database: {e}")
             raise
     
-    def insert_card_read(self, device_id: str, card_id: str, card_value: str) -> int:
-        """Insert a new card read into the database"""
+    def upgrade_page_size(self, max_rows: int = 100000):
+        """Rebuild an existing database with DB_PAGE_SIZE pages if it is small enough"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO card_reads (device_id, card_id, card_value, next_retry)
-                    VALUES (?, ?, ?, datetime('now'))
-                ''', (device_id, card_id, card_value))
-                conn.commit()
-                row_id = cursor.lastrowid
-                logger.info(f"Card read stored in database: ID={card_id}, Value='{card_value}' (DB ID: {row_id})")
-                return row_id
+            with self.lock:
+                page_size = self.conn.execute('PRAGMA page_size').fetchone()[0]
+                if page_size >= DB_PAGE_SIZE:
+                    return
+                
+                rows = self.conn.execute('SELECT COUNT(*) FROM card_reads').fetchone()[0]
+                if rows > max_rows:
+                    logger.info(f"Keeping {page_size} byte pages, {rows} records is too many to rebuild at startup")
+                    return
+                
+                # The page size can't change in WAL mode, so VACUUM with a rollback journal
+                logger.info(f"Rebuilding database with {DB_PAGE_SIZE} byte pages (was {page_size})...")
+                self.conn.execute('PRAGMA journal_mode=DELETE')
+                try:
+                    self.conn.execute(f'PRAGMA page_size={DB_PAGE_SIZE}')
+                    self.conn.execute('VACUUM')
+                finally:
+                    self.conn.execute('PRAGMA journal_mode=WAL')
+                logger.info("Database rebuilt")
         except Exception as e:
-            logger.error(f"Error inserting card read: {e}")
-            raise
+            logger.error(f"Error changing database page size: {e}")
     
-    def get_pending_syncs(self, max_age_days: int = 7) -> List[Tuple]:
-        """Get all pending syncs that are ready for retry"""
+    def insert_card_reads(self, rows: List[Tuple[str, str, str]]):
+        """Insert a batch of (device_id, card_id, card_value) card reads in one transaction"""
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.executemany(INSERT_CARD_READ_SQL, rows)
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+        logger.info(f"Stored {len(rows)} card read(s) in database")
+    
+    def get_pending_syncs(self, max_age_days: int = 7, limit: int = 200) -> List[Tuple]:
+        """Get up to `limit` of the oldest pending syncs that are ready for retry"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT id, device_id, card_id, card_value, timestamp, sync_attempts, last_sync_attempt
-                    FROM card_reads 
-                    WHERE sync_status = 'pending' 
-                    AND (next_retry IS NULL OR next_retry <= datetime('now'))
-                    AND created_at >= datetime('now', '-{} days')
-                    ORDER BY created_at ASC
-                '''.format(max_age_days))
+            with self.lock:
+                cursor = self.conn.cursor()
+                cursor.execute(SELECT_PENDING_SYNCS_SQL, (f'-{max_age_days} days', limit))
                 return cursor.fetchall()
         except Exception as e:
             logger.error(f"Error getting pending syncs: {e}")
             return []
     
-    def update_sync_status(self, row_id: int, status: str, response: str = None, attempts: int = None):
-        """Update the sync status of a card read"""
+    @staticmethod
+    def retry_delay(attempts: int) -> str:
+        """Return the SQLite datetime modifier for the next retry after `attempts` failures"""
+        # Exponential backoff: 1min, 2min, 4min, 8min, 16min, 32min, 1hour, 2hours, 4hours, 8hours, 12hours, 24hours
+        backoff_minutes = min(2 ** (attempts - 1), 1440)  # Max 24 hours
+        return f'+{backoff_minutes} minutes'
+    
+    def bulk_update_sync_status(self, success_rows: List[Tuple[int, str]], failure_rows: List[Tuple[int, str, int]]) -> bool:
+        """Record the outcome of a sync pass in a single transaction
+        
+        success_rows holds (row_id, response) pairs and failure_rows holds
+        (row_id, response, attempts) triples, where attempts already includes
+        the attempt that just failed. Returns True if the update was committed.
+        """
+        if not success_rows and not failure_rows:
+            return True
+        
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                if status == 'success':
-                    cursor.execute('''
-                        UPDATE card_reads 
-                        SET sync_status = ?, webhook_response = ?, last_sync_attempt = datetime('now')
-                        WHERE id = ?
-                    ''', (status, response, row_id))
-                else:
-                    # Calculate next retry time with exponential backoff
-                    if attempts is None:
-                        cursor.execute('SELECT sync_attempts FROM card_reads WHERE id = ?', (row_id,))
-                        attempts = cursor.fetchone()[0] + 1
+            with self.lock:
+                self.conn.execute('BEGIN IMMEDIATE')
+                try:
+                    self.conn.executemany(UPDATE_SYNC_SUCCESS_SQL, 
+                                          [('success', response, row_id) for row_id, response in success_rows])
                     
-                    # Exponential backoff: 1min, 2min, 4min, 8min, 16min, 32min, 1hour, 2hours, 4hours, 8hours, 12hours, 24hours
-                    backoff_minutes = min(2 ** (attempts - 1), 1440)  # Max 24 hours
-                    next_retry = datetime.now() + timedelta(minutes=backoff_minutes)
+                    self.conn.executemany(UPDATE_SYNC_RETRY_SQL, 
+                                          [('pending', attempts, self.retry_delay(attempts), response, row_id)
+                                           for row_id, response, attempts in failure_rows])
                     
-                    cursor.execute('''
-                        UPDATE card_reads 
-                        SET sync_status = ?, sync_attempts = ?, last_sync_attempt = datetime('now'), 
-                            next_retry = ?, webhook_response = ?
-                        WHERE id = ?
-                    ''', (status, attempts, next_retry.strftime('%Y-%m-%d %H:%M:%S'), response, row_id))
-                
-                conn.commit()
-                logger.info(f"Updated sync status for row {row_id}: {status}")
-                
+                    self.conn.execute('COMMIT')
+                except Exception:
+                    self.conn.execute('ROLLBACK')
+                    raise
+            
+            logger.info(f"Updated sync status: {len(success_rows)} success, {len(failure_rows)} pending")
+            return True
+            
         except Exception as e:
             logger.error(f"Error updating sync status: {e}")
+            return False
+    
+    def optimize(self):
+        """Let SQLite refresh planner statistics that have gone stale"""
+        try:
+            with self.lock:
+                self.conn.execute('PRAGMA optimize')
+            logger.debug("Database optimized")
+        except Exception as e:
+            logger.error(f"Error optimizing database: {e}")
     
     def get_sync_stats(self) -> Dict[str, int]:
         """Get synchronization statistics"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
+            with self.lock:
+                cursor = self.conn.cursor()
                 cursor.execute('''
                     SELECT sync_status, COUNT(*) 
                     FROM card_reads 
@@ -181,10 +285,14 @@ class DatabaseManager:
             return {}
 
 class RFIDReader:
-    def __init__(self, config_path: str = "/etc/rfid_reader/config.toml"):
+    def __init__(self, config_path: str = "/etc/rfid_reader/config.toml",
+                 device_id_path: str = "/var/lib/rfid_reader/device_id"):
         self.config_path = config_path
+        self.device_id_path = device_id_path
         self.config = self.load_config()
         self.device_id = self.get_device_id()
+        self.sync_concurrency = max(1, int(self.config.get('sync_concurrency', 4)))
+        self.http = self.create_http_session()
         
         # Initialize database first
         logger.info("Initializing database manager...")
@@ -198,42 +306,9 @@ class RFIDReader:
         # Initialize RFID reader
         logger.info("Initializing RFID reader...")
         
-        # Check if SPI is available
-        try:
-            import spidev
-            logger.info("SPI interface check passed")
-        except ImportError:
-            logger.warning("spidev not available, SPI interface may not work properly")
-        
-        # Check SPI interface status
-        try:
-            with open('/proc/cpuinfo', 'r') as f:
-                if 'Raspberry Pi' in f.read():
-                    logger.info("Running on Raspberry Pi")
-                    
-                    # Check if SPI is enabled in config
-                    try:
-                        with open('/boot/config.txt', 'r') as config:
-                            if 'dtparam=spi=on' in config.read():
-                                logger.info("SPI enabled in /boot/config.txt")
-                            else:
-                                logger.warning("SPI not enabled in /boot/config.txt")
-                    except Exception as e:
-                        logger.warning(f"Could not check /boot/config.txt: {e}")
-                    
-                    # Check if SPI module is loaded
-                    try:
-                        result = subprocess.run(['lsmod'], capture_output=True, text=True)
-                        if 'spi_bcm2835' in result.stdout:
-                            logger.info("SPI kernel module loaded")
-                        else:
-                            logger.warning("SPI kernel module not loaded")
-                    except Exception as e:
-                        logger.warning(f"Could not check loaded modules: {e}")
-                else:
-                    logger.info("Not running on Raspberry Pi")
-        except Exception as e:
-            logger.warning(f"Could not check system info: {e}")
+        # SPI and platform checks fork lsmod and scan several files, so they only run on request
+        if self.config.get('diagnostics', False):
+            self.run_startup_diagnostics()
         
         # Initialize RFID reader with retry logic
         max_init_attempts = 3
@@ -253,12 +328,71 @@ class RFIDReader:
                     logger.error("2. SPI kernel module not loaded")
                     logger.error("3. Hardware not connected properly")
                     logger.error("4. Insufficient permissions")
+                    if not self.config.get('diagnostics', False):
+                        self.run_startup_diagnostics()
                     raise
         
+        # Optional RC522 IRQ line, so the read loop can block in the kernel instead of polling
+        self.irq_pin = self.config.get('irq_pin')
+        if self.irq_pin is not None:
+            GPIO.setup(self.irq_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            logger.info(f"Waiting for cards using RC522 IRQ on pin {self.irq_pin}")
+        
         self.last_card_id = None
         self.sync_thread = None
         self.running = False
         
+        # Card reads are buffered here and written in batches by write_worker
+        self.write_queue = queue.Queue()
+        self.write_thread = None
+        self.write_batch_size = 100
+        self.write_flush_interval = 0.5
+        
+        # Set to wake the sync worker early, after new reads are stored or on shutdown
+        self.sync_kick = threading.Event()
+        
+    def run_startup_diagnostics(self):
+        """Log SPI and platform checks that help troubleshoot reader initialization"""
+        # Check if SPI is available
+        try:
+            import spidev
+            logger.info("SPI interface check passed")
+        except ImportError:
+            logger.warning("spidev not available, SPI interface may not work properly")
+        
+        # Check SPI interface status
+        try:
+            # Scan line by line and stop at the first match instead of reading the whole file
+            with open('/proc/cpuinfo', 'r') as f:
+                is_raspberry_pi = any('Raspberry Pi' in line for line in f)
+            
+            if is_raspberry_pi:
+                logger.info("Running on Raspberry Pi")
+                
+                # Check if SPI is enabled in config
+                try:
+                    with open('/boot/config.txt', 'r') as config:
+                        if any('dtparam=spi=on' in line for line in config):
+                            logger.info("SPI enabled in /boot/config.txt")
+                        else:
+                            logger.warning("SPI not enabled in /boot/config.txt")
+                except Exception as e:
+                    logger.warning(f"Could not check /boot/config.txt: {e}")
+                
+                # Check if SPI module is loaded
+                try:
+                    result = subprocess.run(['lsmod'], capture_output=True, text=True)
+                    if 'spi_bcm2835' in result.stdout:
+                        logger.info("SPI kernel module loaded")
+                    else:
+                        logger.warning("SPI kernel module not loaded")
+                except Exception as e:
+                    logger.warning(f"Could not check loaded modules: {e}")
+            else:
+                logger.info("Not running on Raspberry Pi")
+        except Exception as e:
+            logger.warning(f"Could not check system info: {e}")
+    
     def load_config(self) -> Dict[str, Any]:
         """Load configuration from TOML file"""
         try:
@@ -273,81 +407,102 @@ class RFIDReader:
             logger.error(f"Error loading configuration: {e}")
             sys.exit(1)
     
-    def generate_device_id(self) -> str:
+    @staticmethod
+    def generate_device_id() -> str:
         """Generate a unique device ID based on hardware info"""
         try:
-            # Get CPU serial number
+            # The low 12 hex digits of the CPU serial are unique per Raspberry Pi
+            serial = ""
             with open('/proc/cpuinfo', 'r') as f:
                 for line in f:
                     if line.startswith('Serial'):
-                        serial = line.split(':')[1].strip()
+                        serial = line.split(':')[1].strip().lower()
                         break
-                else:
-                    serial = "unknown"
-            
-            # Get MAC address
-            try:
-                result = subprocess.run(['ip', 'link', 'show'], capture_output=True, text=True)
-                mac_lines = [line for line in result.stdout.split('\n') if 'link/ether' in line]
-                if mac_lines:
-                    mac = mac_lines[0].split()[1]
-                else:
-                    mac = "unknown"
-            except:
-                mac = "unknown"
-            
-            # Create unique ID
-            unique_string = f"{serial}_{mac}_{int(time.time())}"
-            device_id = hashlib.md5(unique_string.encode()).hexdigest()[:12]
-            
-            return device_id
+            if len(serial) >= 12 and int(serial, 16):
+                return serial[-12:]
         except Exception as e:
-            logger.error(f"Error generating device ID: {e}")
-            return f"rfid_{int(time.time())}"
+            logger.warning(f"Could not read CPU serial: {e}")
+        
+        try:
+            # Fall back to the Ethernet MAC address, which is also 12 hex digits
+            with open('/sys/class/net/eth0/address', 'r') as f:
+                mac = f.read().strip().replace(':', '').lower()
+            if len(mac) == 12 and int(mac, 16):
+                return mac
+        except Exception as e:
+            logger.warning(f"Could not read MAC address: {e}")
+        
+        # No usable hardware identifier, so pick a random one (it is persisted anyway)
+        return secrets.token_hex(6)
     
     def get_device_id(self) -> str:
         """Get or generate device ID"""
-        device_id = self.config.get('device_id')
+        configured_id = self.config.get('device_id')
+        
+        # Reuse the ID generated on first boot
+        try:
+            with open(self.device_id_path, 'r') as f:
+                device_id = f.read().strip()
+        except FileNotFoundError:
+            device_id = None
+        except Exception as e:
+            logger.error(f"Error reading device ID file: {e}")
+            device_id = None
+        
+        if configured_id:
+            # The configured ID always wins; neither file is rewritten
+            if device_id and device_id != configured_id:
+                logger.warning(f"Configured device ID {configured_id} differs from stored ID {device_id} in {self.device_id_path}")
+            logger.info(f"Using configured device ID: {configured_id}")
+            return configured_id
         
-        if not device_id:
+        if device_id:
+            logger.info(f"Using existing device ID: {device_id}")
+        else:
             # Generate new device ID
             device_id = self.generate_device_id()
-            
-            # Update config file
-            self.update_config_device_id(device_id)
+            self.save_device_id(device_id)
             logger.info(f"Generated new device ID: {device_id}")
-        else:
-            logger.info(f"Using existing device ID: {device_id}")
         
         return device_id
     
-    def update_config_device_id(self, device_id: str):
-        """Update the config file with the new device ID"""
+    def save_device_id(self, device_id: str):
+        """Store the generated device ID so it survives restarts"""
         try:
-            # Read current config
-            with open(self.config_path, 'r') as f:
-                content = f.read()
+            os.makedirs(os.path.dirname(self.device_id_path), exist_ok=True)
             
-            # Add or update device_id
-            if 'device_id' in content:
-                # Update existing device_id
-                lines = content.split('\n')
-                for i, line in enumerate(lines):
-                    if line.strip().startswith('device_id'):
-                        lines[i] = f'device_id = "{device_id}"'
-                        break
-                content = '\n'.join(lines)
-            else:
-                # Add device_id at the end
-                content += f'\ndevice_id = "{device_id}"\n'
+            # Write to a temporary file and rename so a crash never leaves a partial ID
+            tmp_path = f"{self.device_id_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(f"{device_id}\n")
+            os.replace(tmp_path, self.device_id_path)
             
-            # Write back to file
-            with open(self.config_path, 'w') as f:
-                f.write(content)
-                
-            logger.info(f"Updated config file with device ID: {device_id}")
+            logger.info(f"Saved device ID to {self.device_id_path}")
         except Exception as e:
-            logger.error(f"Error updating config file: {e}")
+            logger.error(f"Error saving device ID: {e}")
+    
+    def create_http_session(self) -> requests.Session:
+        """Create the HTTP session reused for every webhook call
+        
+        Reusing the session keeps the TCP/TLS connection to the webhook alive
+        between requests, which matters most when catching up on a backlog.
+        """
+        session = requests.Session()
+        
+        # Retries are handled by the database backoff, so the adapter never retries
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.sync_concurrency, max_retries=0)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        
+        session.headers.update({'Content-Type': 'application/json'})
+        
+        # Add API key if configured
+        api_key = self.config.get('api_key')
+        if api_key:
+            session.headers['x-api-key'] = api_key
+            logger.debug("API key included in webhook requests")
+        
+        return session
     
     def send_webhook(self, card_id: str, card_value: str) -> Tuple[bool, str]:
         """Send RFID data to webhook and return success status and response"""
@@ -362,20 +517,10 @@ class RFIDReader:
             'card_value': card_value
         }
         
-        # Prepare headers
-        headers = {'Content-Type': 'application/json'}
-        
-        # Add API key if configured
-        api_key = self.config.get('api_key')
-        if api_key:
-            headers['x-api-key'] = api_key
-            logger.debug("API key included in webhook request")
-        
         try:
-            response = requests.post(
+            response = self.http.post(
                 webhook_url,
                 json=payload,
-                headers=headers,
                 timeout=10
             )
             
@@ -390,13 +535,82 @@ class RFIDReader:
             logger.error(f"Error sending webhook: {e}")
             return False, str(e)
     
+    def wait_for_card(self, timeout_ms: int = 100) -> bool:
+        """Block on the RC522 IRQ line until a card answers or the timeout expires
+        
+        The RC522 only raises its IRQ in response to a command, so each call asks
+        any card in the field to answer a REQA and then waits for the receive
+        interrupt on the GPIO pin.
+        """
+        rc522 = self.reader.READER
+        
+        # Enable only the receive interrupt, with the IRQ output active low
+        rc522.Write_MFRC522(rc522.CommIEnReg, 0xA0)
+        rc522.Write_MFRC522(rc522.CommIrqReg, 0x7F)
+        
+        # Same sequence as MFRC522_ToCard: flush the FIFO and stop any running
+        # command, so bytes left by an interrupted read can't corrupt the REQA
+        rc522.SetBitMask(rc522.FIFOLevelReg, 0x80)
+        rc522.Write_MFRC522(rc522.CommandReg, rc522.PCD_IDLE)
+        
+        # Transmit REQA; a card in the field answers and triggers RxIRq
+        rc522.Write_MFRC522(rc522.FIFODataReg, rc522.PICC_REQIDL)
+        rc522.Write_MFRC522(rc522.CommandReg, rc522.PCD_TRANSCEIVE)
+        rc522.Write_MFRC522(rc522.BitFramingReg, 0x87)
+        
+        channel = GPIO.wait_for_edge(self.irq_pin, GPIO.FALLING, timeout=timeout_ms)
+        
+        rc522.ClearBitMask(rc522.BitFramingReg, 0x80)
+        rc522.Write_MFRC522(rc522.CommIrqReg, 0x7F)
+        return channel is not None
+    
+    def read_tag(self, send_request: bool = True) -> Tuple[Optional[int], Optional[str]]:
+        """Read the UID and text of the card in the field, like SimpleMFRC522.read_no_block
+        
+        Pass send_request=False when the card has already answered a REQA, since a
+        card in the READY state treats a second REQA as an error and goes back to IDLE.
+        """
+        rc522 = self.reader.READER
+        
+        if send_request:
+            status, _ = rc522.MFRC522_Request(rc522.PICC_REQIDL)
+            if status != rc522.MI_OK:
+                return None, None
+        
+        status, uid = rc522.MFRC522_Anticoll()
+        if status != rc522.MI_OK:
+            return None, None
+        id = self.reader.uid_to_num(uid)
+        
+        rc522.MFRC522_SelectTag(uid)
+        status = rc522.MFRC522_Auth(rc522.PICC_AUTHENT1A, 11, self.reader.KEY, uid)
+        data = []
+        if status == rc522.MI_OK:
+            for block_num in self.reader.BLOCK_ADDRS:
+                block = rc522.MFRC522_Read(block_num)
+                if block:
+                    data += block
+        rc522.MFRC522_StopCrypto1()
+        return id, ''.join(chr(i) for i in data)
+    
     def read_card(self) -> Optional[tuple]:
         """Read RFID card and return (card_id, card_value) tuple"""
         try:
-            # Add a small delay to prevent excessive reads
-            time.sleep(0.1)
+            if self.irq_pin is not None:
+                # Only talk to the reader once the IRQ says a card is present. The card
+                # already answered the REQA, so continue straight with anticollision
+                if not self.wait_for_card():
+                    return None
+                id, text = self.read_tag(send_request=False)
+            else:
+                # Add a small delay to prevent excessive reads
+                time.sleep(0.1)
+                
+                # Non-blocking read, so the loop stays responsive to shutdown between attempts
+                id, text = self.read_tag()
+            if id is None:
+                return None
             
-            id, text = self.reader.read()
             card_id = str(id)
             card_value = text.strip() if text else ""
             
@@ -417,49 +631,108 @@ class RFIDReader:
                 logger.error(f"Failed to reset RFID reader: {reset_error}")
             return None
     
-    def sync_pending_data(self):
-        """Sync all pending data to the webhook"""
-        pending_syncs = self.db_manager.get_pending_syncs()
+    def sync_pending_data(self, batch_size: int = 200) -> bool:
+        """Sync one batch of pending data to the webhook
+        
+        Returns True if the batch was full and recorded, so more pending
+        records may be waiting.
+        """
+        pending_syncs = self.db_manager.get_pending_syncs(limit=batch_size)
         
         if not pending_syncs:
-            return
+            return False
         
         logger.info(f"Attempting to sync {len(pending_syncs)} pending records...")
         
-        for row_id, device_id, card_id, card_value, timestamp, attempts, last_attempt in pending_syncs:
+        def send_record(record):
+            row_id, device_id, card_id, card_value, timestamp, attempts, last_attempt = record
             try:
-                success, response = self.send_webhook(card_id, card_value)
-                
-                if success:
-                    self.db_manager.update_sync_status(row_id, 'success', response)
-                    logger.info(f"Successfully synced card read {row_id}: ID={card_id}, Value='{card_value}'")
-                else:
-                    new_attempts = attempts + 1
-                    self.db_manager.update_sync_status(row_id, 'pending', response, new_attempts)
-                    logger.warning(f"Failed to sync card read {row_id}: ID={card_id}, Value='{card_value}' (attempt {new_attempts})")
-                    
+                return self.send_webhook(card_id, card_value)
             except Exception as e:
                 logger.error(f"Error syncing card read {row_id}: {e}")
-                new_attempts = attempts + 1
-                self.db_manager.update_sync_status(row_id, 'pending', str(e), new_attempts)
+                return False, str(e)
+        
+        # Network waits release the GIL, so a few concurrent requests drain a backlog much faster
+        with ThreadPoolExecutor(max_workers=self.sync_concurrency) as executor:
+            results = list(executor.map(send_record, pending_syncs))
+        
+        success_rows = []
+        failure_rows = []
+        
+        for record, (success, response) in zip(pending_syncs, results):
+            row_id, device_id, card_id, card_value, timestamp, attempts, last_attempt = record
+            
+            if success:
+                success_rows.append((row_id, response))
+                logger.info(f"Successfully synced card read {row_id}: ID={card_id}, Value='{card_value}'")
+            else:
+                failure_rows.append((row_id, response, attempts + 1))
+                logger.warning(f"Failed to sync card read {row_id}: ID={card_id}, Value='{card_value}' (attempt {attempts + 1})")
+        
+        # Write all outcomes in one transaction instead of one commit per record
+        updated = self.db_manager.bulk_update_sync_status(success_rows, failure_rows)
+        return updated and len(pending_syncs) == batch_size
+    
+    def write_worker(self):
+        """Background worker that stores queued card reads in batched transactions"""
+        batch = []
+        while True:
+            try:
+                # Wait for a card read, then collect whatever else arrives within the flush
+                # interval. A batch kept after a failed insert is not grown past the batch
+                # size; further reads wait in the queue until it is stored
+                if len(batch) < self.write_batch_size:
+                    batch.append(self.write_queue.get(timeout=self.write_flush_interval))
+                deadline = time.monotonic() + self.write_flush_interval
+                while len(batch) < self.write_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    batch.append(self.write_queue.get(timeout=remaining))
+            except queue.Empty:
+                pass
+            
+            if batch:
+                try:
+                    self.db_manager.insert_card_reads(batch)
+                    batch = []
+                    self.sync_kick.set()
+                except Exception as e:
+                    logger.error(f"Failed to store card reads in database: {e}")
+                    if not self.running:
+                        logger.error(f"Discarding {len(batch)} unsaved card read(s) on shutdown")
+                        break
+                    time.sleep(1)  # Keep the batch and retry
+            elif not self.running:
+                break
     
     def sync_worker(self):
         """Background worker for syncing data"""
+        last_optimize = time.monotonic()
         while self.running:
             try:
-                self.sync_pending_data()
+                # Work through the backlog one bounded batch at a time
+                while self.running and self.sync_pending_data():
+                    pass
                 
                 # Log sync statistics
                 stats = self.db_manager.get_sync_stats()
                 if stats:
                     logger.info(f"Sync stats: {stats}")
                 
-                # Wait before next sync attempt
-                time.sleep(30)  # Sync every 30 seconds
+                # Refresh query planner statistics roughly once an hour
+                if time.monotonic() - last_optimize >= 3600:
+                    self.db_manager.optimize()
+                    last_optimize = time.monotonic()
+                
+                # Sync every 30 seconds, or as soon as new reads are stored
+                self.sync_kick.wait(timeout=30)
+                self.sync_kick.clear()
                 
             except Exception as e:
                 logger.error(f"Error in sync worker: {e}")
-                time.sleep(60)  # Wait longer on error
+                self.sync_kick.wait(timeout=60)  # Wait longer on error
+                self.sync_kick.clear()
     
     def run(self):
         """Main loop to continuously read RFID cards"""
@@ -467,8 +740,14 @@ class RFIDReader:
         logger.info(f"Device ID: {self.device_id}")
         logger.info(f"Webhook URL: {self.config.get('webhook_url', 'Not configured')}")
         
-        # Start sync worker thread
         self.running = True
+        
+        # Start database writer thread
+        self.write_thread = threading.Thread(target=self.write_worker, daemon=True)
+        self.write_thread.start()
+        logger.info("Background database writer started")
+        
+        # Start sync worker thread
         self.sync_thread = threading.Thread(target=self.sync_worker, daemon=True)
         self.sync_thread.start()
         logger.info("Background sync worker started")
@@ -483,14 +762,10 @@ class RFIDReader:
                     
                     if card_data:
                         card_id, card_value = card_data
-                        # Store in database immediately (write-through)
-                        try:
-                            row_id = self.db_manager.insert_card_read(self.device_id, card_id, card_value)
-                            logger.info(f"Card read stored: ID={card_id}, Value='{card_value}' (DB ID: {row_id})")
-                            consecutive_errors = 0  # Reset error counter on successful read
-                        except Exception as e:
-                            logger.error(f"Failed to store card read in database: {e}")
-                            consecutive_errors += 1
+                        # Queue for the database writer, which commits within write_flush_interval
+                        self.write_queue.put((self.device_id, card_id, card_value))
+                        logger.info(f"Card read queued: ID={card_id}, Value='{card_value}'")
+                        consecutive_errors = 0  # Reset error counter on successful read
                     
                     # Small delay to prevent excessive CPU usage
                     time.sleep(0.05)
@@ -513,18 +788,29 @@ class RFIDReader:
                     time.sleep(1)  # Wait before retrying
                 
         except KeyboardInterrupt:
-            logger.info("RFID reader service stopped by user")
+            logger.info("RFID reader service stopped")
         except Exception as e:
             logger.error(f"Unexpected error in main loop: {e}")
         finally:
             self.running = False
+            self.sync_kick.set()
+            if self.write_thread:
+                self.write_thread.join(timeout=5)
             if self.sync_thread:
                 self.sync_thread.join(timeout=5)
             GPIO.cleanup()
             logger.info("GPIO cleanup completed")
 
+def handle_sigterm(signum, frame):
+    """Stop the main loop like Ctrl+C, so queued card reads are stored before exit"""
+    raise KeyboardInterrupt
+
 def main():
     """Main entry point"""
+    configure_logging()
+    # systemd stops the service with SIGTERM, whose default action would skip the
+    # write queue drain in run()
+    signal.signal(signal.SIGTERM, handle_sigterm)
     try:
         logger.info("Starting RFID reader application...")
         reader = RFIDReader()
@@ -4,10 +4,55 @@ Simple webhook test server for RFID reader testing
 This server receives webhook requests from the RFID reader and logs them
 """
 
-import json
+import argparse
+import gzip
+import hmac
 import logging
-from datetime import datetime
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple, Union
+
+# Prefer orjson for (de)serializing webhook bodies, falling back to the stdlib
+try:
+    import orjson
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    import json
+    
+    def json_loads(data):
+        # json.loads doesn't accept memoryviews
+        return json.loads(bytes(data))
+    
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+
+# uvicorn is optional; without it the stdlib HTTPServer is used
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
+
+# uvloop is optional; uvicorn uses the stock asyncio loop without it
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# zstandard is optional; large responses fall back to gzip without it
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 # Configure logging
 logging.basicConfig(
@@ -16,143 +61,443 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Fixed response bodies are serialized once instead of on every request
+MISSING_API_KEY_RESPONSE = json_dumps({
+    'status': 'error',
+    'message': 'Missing or invalid x-api-key header'
+})
+INVALID_API_KEY_RESPONSE = json_dumps({
+    'status': 'error',
+    'message': 'Invalid API key'
+})
+SUCCESS_RESPONSE_TEMPLATE = b'{"status":"success","message":"Webhook received successfully","timestamp":"%s"}'
+HEALTH_RESPONSE = b'RFID Webhook Test Server is running'
+METHOD_NOT_ALLOWED_RESPONSE = json_dumps({
+    'status': 'error',
+    'message': 'Method not allowed'
+})
+INVALID_CONTENT_LENGTH_RESPONSE = json_dumps({
+    'status': 'error',
+    'message': 'Invalid Content-Length header'
+})
+INCOMPLETE_BODY_RESPONSE = json_dumps({
+    'status': 'error',
+    'message': 'Request body is shorter than Content-Length'
+})
+
+# Status lines for the responses WebhookHandler writes itself
+STATUS_LINES = {
+    status: f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n".encode()
+    for status in (200, 400, 401, 500)
+}
+
+# Complete 401 responses keyed by body, written without a per-request access log
+# line since check_api_key already logs the rejection
+UNAUTHORIZED_RESPONSES = {
+    body: STATUS_LINES[401] + b'Content-Type: application/json\r\nContent-Length: %d\r\nConnection: close\r\n\r\n%s' % (len(body), body)
+    for body in (MISSING_API_KEY_RESPONSE, INVALID_API_KEY_RESPONSE)
+}
+
+@dataclass(frozen=True, slots=True)
+class ServerConfig:
+    """Settings for the webhook test server"""
+    port: int = 8080
+    api_key: Optional[str] = None
+    max_workers: int = 16
+    processes: int = 1
+    # Encoded once for comparing against raw header bytes
+    api_key_bytes: Optional[bytes] = field(init=False, repr=False)
+    
+    def __post_init__(self):
+        object.__setattr__(self, 'api_key_bytes', self.api_key.encode() if self.api_key else None)
+
+# Request bodies are read into a buffer reused by each handler thread; bodies
+# larger than this get a one-off buffer so a single big request isn't kept around
+BODY_BUFFER_SIZE = 8192
+MAX_BODY_BUFFER_SIZE = 65536
+body_buffers = threading.local()
+
+# Responses smaller than this are sent uncompressed, since compression
+# wouldn't save a packet
+COMPRESSION_THRESHOLD = 1024
+# ZstdCompressor instances can't be shared between threads
+zstd_compressors = threading.local()
+
+# (second, text, bytes) of the last formatted timestamp, replaced as one tuple
+# so threads never see a torn update
+cached_timestamp = (0, '', b'')
+
+def current_timestamp() -> Tuple[str, bytes]:
+    """Return the local time to the second, formatting it at most once per second"""
+    global cached_timestamp
+    now = int(time.time())
+    second, text, encoded = cached_timestamp
+    if now != second:
+        text = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now))
+        encoded = text.encode()
+        cached_timestamp = (now, text, encoded)
+    return text, encoded
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Return the content codings an Accept-Encoding header allows"""
+    encodings = set()
+    for item in accept_encoding.lower().split(','):
+        coding, _, params = item.partition(';')
+        # A zero quality value means the coding is not acceptable
+        if params.replace(' ', '').rstrip('0') in ('q=', 'q=0.'):
+            continue
+        encodings.add(coding.strip())
+    return encodings
+
+def compress_body(body: bytes, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[bytes]]:
+    """Compress a large response body for the client, returning it and its Content-Encoding"""
+    if len(body) < COMPRESSION_THRESHOLD or not accept_encoding:
+        return body, None
+    
+    encodings = accepted_encodings(accept_encoding)
+    if zstandard and 'zstd' in encodings:
+        compressor = getattr(zstd_compressors, 'compressor', None)
+        if compressor is None:
+            compressor = zstd_compressors.compressor = zstandard.ZstdCompressor(level=1)
+        return compressor.compress(body), b'zstd'
+    if 'gzip' in encodings:
+        return gzip.compress(body, compresslevel=1), b'gzip'
+    return body, None
+
+def check_api_key(expected_api_key: Optional[bytes], provided_api_key: bytes) -> Optional[bytes]:
+    """Return an error response body if the API key is missing or wrong, otherwise None"""
+    if not expected_api_key:
+        return None
+    
+    if not provided_api_key:
+        logger.warning("Missing or invalid x-api-key header")
+        return MISSING_API_KEY_RESPONSE
+    
+    # Constant-time comparison so response timing doesn't leak the key
+    if not hmac.compare_digest(provided_api_key, expected_api_key):
+        logger.warning("Invalid API key provided: %s...", provided_api_key[:8].decode('latin-1'))
+        return INVALID_API_KEY_RESPONSE
+    
+    logger.info("API key authentication successful")
+    return None
+
+def parse_content_length(value: Optional[str]) -> Optional[int]:
+    """Return the body length from a Content-Length header, or None if it is invalid"""
+    if value is None:
+        return 0
+    
+    # Only plain ASCII digits; int() would also take signs, underscores and other scripts
+    value = value.strip()
+    if not (value.isascii() and value.isdigit()):
+        logger.warning("Invalid Content-Length header: %s", value[:20])
+        return None
+    return int(value)
+
+def process_webhook(post_data: Union[bytes, memoryview], remote_address: str) -> Tuple[int, bytes]:
+    """Parse and log a webhook body, returning the status code and response body"""
+    try:
+        # Parse JSON
+        data = json_loads(post_data)
+        
+        # Log the received data
+        timestamp, encoded_timestamp = current_timestamp()
+        # One record instead of five, formatted only if INFO is enabled
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "Received webhook at %s:\n  Device ID: %s\n  Card ID: %s\n  Card Value: %s\n  Remote Address: %s",
+                timestamp,
+                data.get('device_id', 'Unknown'),
+                data.get('card_id', 'Unknown'),
+                data.get('card_value', 'Unknown'),
+                remote_address
+            )
+        
+        return 200, SUCCESS_RESPONSE_TEMPLATE % encoded_timestamp
+        
+    except Exception as e:
+        logger.error(f"Error processing webhook: {e}")
+        return 500, json_dumps({
+            'status': 'error',
+            'message': str(e)
+        })
+
 class WebhookHandler(BaseHTTPRequestHandler):
-    def __init__(self, *args, expected_api_key=None, **kwargs):
-        self.expected_api_key = expected_api_key
+    # Keep connections open between webhooks; every response sets Content-Length
+    protocol_version = "HTTP/1.1"
+    # Drop idle keep-alive connections so they don't hold a worker thread
+    timeout = 5
+    
+    def __init__(self, *args, config: ServerConfig = ServerConfig(), **kwargs):
+        # Set before super().__init__, which handles the whole connection
+        self.config = config
         super().__init__(*args, **kwargs)
     
+    def send_body(self, status: int, content_type: bytes, body: bytes):
+        """Send the status line, headers and body in a single write"""
+        self.log_request(status)
+        body, content_encoding = compress_body(body, self.headers.get('Accept-Encoding'))
+        self.wfile.write(b'%sServer: %s\r\nDate: %s\r\nContent-Type: %s\r\n%sContent-Length: %d\r\nConnection: %s\r\n\r\n%s' % (
+            STATUS_LINES[status],
+            self.version_string().encode(),
+            self.date_time_string().encode(),
+            content_type,
+            b'Content-Encoding: %s\r\nVary: Accept-Encoding\r\n' % content_encoding if content_encoding else b'',
+            len(body),
+            b'close' if self.close_connection else b'keep-alive',
+            body
+        ))
+    
+    def send_json(self, status: int, body: bytes):
+        """Send a serialized JSON response"""
+        self.send_body(status, b'application/json', body)
+    
+    def read_body(self, content_length: int) -> memoryview:
+        """Read the request body into this thread's reusable buffer"""
+        buffer = getattr(body_buffers, 'buffer', None)
+        if content_length > MAX_BODY_BUFFER_SIZE:
+            buffer = bytearray(content_length)
+        elif buffer is None or len(buffer) < content_length:
+            buffer = body_buffers.buffer = bytearray(max(content_length, BODY_BUFFER_SIZE))
+        
+        body = memoryview(buffer)[:content_length]
+        if self.rfile.readinto(body) < content_length:
+            raise ValueError("Request body is shorter than Content-Length")
+        return body
+    
     def do_POST(self):
         """Handle POST requests from RFID reader"""
         try:
+            headers = self.headers
+            
             # Check API key if expected
-            if self.expected_api_key:
-                auth_header = self.headers.get('x-api-key', '')
-                if not auth_header:
-                    logger.warning(f"Missing or invalid x-api-key header: {auth_header}")
-                    self.send_response(401)
-                    self.send_header('Content-type', 'application/json')
-                    self.end_headers()
-                    error_response = {
-                        'status': 'error',
-                        'message': 'Missing or invalid x-api-key header'
-                    }
-                    self.wfile.write(json.dumps(error_response).encode())
-                    return
-                
-                provided_api_key = auth_header
-                if provided_api_key != self.expected_api_key:
-                    logger.warning(f"Invalid API key provided: {provided_api_key[:8]}...")
-                    self.send_response(401)
-                    self.send_header('Content-type', 'application/json')
-                    self.end_headers()
-                    error_response = {
-                        'status': 'error',
-                        'message': 'Invalid API key'
-                    }
-                    self.wfile.write(json.dumps(error_response).encode())
+            expected_api_key = self.config.api_key_bytes
+            if expected_api_key:
+                # Header values are decoded as latin-1, so this recovers the raw bytes
+                provided_api_key = (headers.get('x-api-key') or '').encode('latin-1')
+                error_response = check_api_key(expected_api_key, provided_api_key)
+                if error_response:
+                    # The body is left unread, so the connection can't be reused
+                    self.close_connection = True
+                    self.wfile.write(UNAUTHORIZED_RESPONSES[error_response])
                     return
-                
-                logger.info("API key authentication successful")
             
             # Get content length
-            content_length = int(self.headers.get('Content-Length', 0))
+            content_length = parse_content_length(headers.get('Content-Length'))
+            if content_length is None:
+                # The body length is unknown, so the connection can't be reused
+                self.close_connection = True
+                self.send_json(400, INVALID_CONTENT_LENGTH_RESPONSE)
+                return
             
             # Read request body
-            post_data = self.rfile.read(content_length)
+            post_data = self.read_body(content_length)
             
-            # Parse JSON
-            data = json.loads(post_data.decode('utf-8'))
-            
-            # Log the received data
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            logger.info(f"Received webhook at {timestamp}:")
-            logger.info(f"  Device ID: {data.get('device_id', 'Unknown')}")
-            logger.info(f"  Card ID: {data.get('card_id', 'Unknown')}")
-            logger.info(f"  Card Value: {data.get('card_value', 'Unknown')}")
-            logger.info(f"  Remote Address: {self.client_address[0]}")
-            
-            # Send response
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            
-            response = {
-                'status': 'success',
-                'message': 'Webhook received successfully',
-                'timestamp': timestamp
-            }
-            
-            self.wfile.write(json.dumps(response).encode())
+            status, response = process_webhook(post_data, self.client_address[0])
+            self.send_json(status, response)
             
         except Exception as e:
             logger.error(f"Error processing webhook: {e}")
-            self.send_response(500)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            
-            error_response = {
+            self.close_connection = True
+            self.send_json(500, json_dumps({
                 'status': 'error',
                 'message': str(e)
-            }
-            
-            self.wfile.write(json.dumps(error_response).encode())
+            }))
     
     def do_GET(self):
         """Handle GET requests (health check)"""
-        self.send_response(200)
-        self.send_header('Content-type', 'text/plain')
-        self.end_headers()
-        self.wfile.write(b'RFID Webhook Test Server is running')
+        self.send_body(200, b'text/plain', HEALTH_RESPONSE)
     
     def log_message(self, format, *args):
         """Override to use our logger"""
-        logger.info(f"{self.address_string()} - {format % args}")
+        logger.info("%s - " + format, self.address_string(), *args)
 
-def run_server(port=8080, expected_api_key=None):
-    """Run the webhook test server"""
-    server_address = ('', port)
+class PooledHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer that handles connections on a bounded thread pool"""
+    daemon_threads = True
+    allow_reuse_address = True
+    
+    def __init__(self, server_address, handler_class, max_workers: int = 16, reuse_port: bool = False):
+        # SO_REUSEPORT lets prefork processes share the port, with the kernel balancing
+        # connections. Off otherwise, so a second server fails with EADDRINUSE instead
+        # of silently taking half the connections
+        self.allow_reuse_port = reuse_port
+        # Created first, since a failed bind calls server_close() from the base __init__
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        super().__init__(server_address, handler_class)
     
-    # Create a custom handler class with the expected API key
-    class CustomWebhookHandler(WebhookHandler):
-        def __init__(self, *args, **kwargs):
-            super().__init__(*args, expected_api_key=expected_api_key, **kwargs)
+    def get_request(self):
+        request, client_address = super().get_request()
+        # Send small responses immediately instead of waiting on Nagle's algorithm
+        request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return request, client_address
     
-    httpd = HTTPServer(server_address, CustomWebhookHandler)
+    def process_request(self, request, client_address):
+        # Queue the connection instead of starting a thread per connection
+        self.executor.submit(self.process_request_thread, request, client_address)
     
-    logger.info(f"Starting webhook test server on port {port}")
-    logger.info(f"Server will receive POST requests at http://localhost:{port}")
-    if expected_api_key:
-        logger.info(f"API key authentication enabled: {expected_api_key[:8]}...")
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def create_asgi_app(config: ServerConfig):
+    """Create an ASGI app that serves the same endpoints as WebhookHandler"""
+    expected_api_key = config.api_key_bytes
+    
+    async def send_response(send, status: int, content_type: bytes, body: bytes,
+                            accept_encoding: Optional[bytes] = None, extra_headers=()):
+        body, content_encoding = compress_body(body, accept_encoding.decode('latin-1') if accept_encoding else None)
+        headers = [(b'content-type', content_type), (b'content-length', str(len(body)).encode()), *extra_headers]
+        if content_encoding:
+            headers += [(b'content-encoding', content_encoding), (b'vary', b'Accept-Encoding')]
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': headers
+        })
+        await send({'type': 'http.response.body', 'body': body})
+    
+    async def app(scope, receive, send):
+        if scope['type'] != 'http':
+            return
+        
+        method = scope['method']
+        if method in ('GET', 'HEAD'):
+            # Health check; uvicorn drops the body for HEAD
+            await send_response(send, 200, b'text/plain', HEALTH_RESPONSE)
+            return
+        
+        if method != 'POST':
+            await send_response(send, 405, b'application/json', METHOD_NOT_ALLOWED_RESPONSE,
+                                extra_headers=[(b'allow', b'GET, HEAD, POST')])
+            return
+        
+        headers = dict(scope['headers'])
+        error_response = check_api_key(expected_api_key, headers.get(b'x-api-key', b''))
+        if error_response:
+            await send_response(send, 401, b'application/json', error_response)
+            return
+        
+        # Read request body; small webhooks arrive in one message, which is used without copying
+        message = await receive()
+        post_data = message.get('body', b'')
+        if message.get('more_body', False):
+            chunks = [post_data]
+            while message.get('more_body', False):
+                message = await receive()
+                chunks.append(message.get('body', b''))
+            post_data = b''.join(chunks)
+        
+        # The client went away before sending the whole body; don't treat the part as a webhook
+        if message['type'] == 'http.disconnect':
+            logger.warning("Client disconnected before sending the full request body")
+            await send_response(send, 400, b'application/json', INCOMPLETE_BODY_RESPONSE)
+            return
+        
+        client = scope.get('client')
+        status, response = process_webhook(post_data, client[0] if client else 'Unknown')
+        await send_response(send, status, b'application/json', response, headers.get(b'accept-encoding'))
+    
+    return app
+
+def run_server(config: ServerConfig):
+    """Run the webhook test server"""
+    logger.info(f"Starting webhook test server on port {config.port}")
+    logger.info(f"Server will receive POST requests at http://localhost:{config.port}")
+    if config.api_key:
+        logger.info(f"API key authentication enabled: {config.api_key[:8]}...")
     else:
         logger.info("API key authentication disabled")
     logger.info("Press Ctrl+C to stop the server")
     
+    if uvicorn and config.processes == 1:
+        # Serve concurrent webhooks from a single event loop
+        loop = 'uvloop' if uvloop else 'asyncio'
+        logger.info(f"Using uvicorn with the {loop} event loop")
+        uvicorn.run(create_asgi_app(config), host='0.0.0.0', port=config.port,
+                    loop=loop, log_level='info', lifespan='off')
+        logger.info("Shutting down webhook test server...")
+        return
+    
+    server_address = ('', config.port)
+    
+    # Bind the settings into the handler factory
+    handler = partial(WebhookHandler, config=config)
+    
+    httpd = PooledHTTPServer(server_address, handler, config.max_workers, reuse_port=config.processes > 1)
+    
+    # Fork the remaining processes after the first bind succeeded; each binds its
+    # own SO_REUSEPORT socket and the kernel spreads connections across them
+    children = []
+    for _ in range(config.processes - 1):
+        pid = os.fork()
+        if pid == 0:
+            httpd.socket.close()
+            run_worker_process(server_address, handler, config.max_workers)
+        children.append(pid)
+    
+    if children:
+        logger.info(f"Serving from {len(children) + 1} processes")
+        # Exit through the finally block below so the children are stopped too
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
     try:
         httpd.serve_forever()
     except KeyboardInterrupt:
         logger.info("Shutting down webhook test server...")
+    finally:
         httpd.server_close()
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            os.waitpid(pid, 0)
 
-if __name__ == "__main__":
-    import sys
+def run_worker_process(server_address, handler, max_workers: int):
+    """Serve from a forked process on its own listening socket; never returns"""
+    exit_code = 0
+    try:
+        httpd = PooledHTTPServer(server_address, handler, max_workers, reuse_port=True)
+        try:
+            httpd.serve_forever()
+        finally:
+            httpd.server_close()
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logger.error(f"Server process {os.getpid()} failed: {e}")
+        exit_code = 1
+    os._exit(exit_code)
+
+def positive_int(value: str) -> int:
+    """Argparse type for counts that must be at least 1"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {number}")
+    return number
+
+def parse_args() -> ServerConfig:
+    """Parse command line arguments into the server settings"""
+    parser = argparse.ArgumentParser(description='Webhook test server for the RFID reader')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on (default: 8080)')
+    parser.add_argument('--api-key', help='Require this value in the x-api-key header')
+    parser.add_argument('--workers', type=positive_int, default=16,
+                        help='Maximum concurrent connections per process without uvicorn (default: 16)')
+    parser.add_argument('--processes', type=positive_int, default=1,
+                        help='Server processes sharing the port; '
+                             'more than 1 uses the stdlib server (default: 1)')
+    args = parser.parse_args()
     
-    port = 8080
-    expected_api_key = None
+    processes = args.processes
+    if processes > 1 and not hasattr(os, 'fork'):
+        logger.warning("Multiple server processes need os.fork, using a single process")
+        processes = 1
     
-    # Parse command line arguments
-    i = 1
-    while i < len(sys.argv):
-        if sys.argv[i] == '--port' and i + 1 < len(sys.argv):
-            try:
-                port = int(sys.argv[i + 1])
-                i += 2
-            except ValueError:
-                logger.error("Invalid port number")
-                sys.exit(1)
-        elif sys.argv[i] == '--api-key' and i + 1 < len(sys.argv):
-            expected_api_key = sys.argv[i + 1]
-            i += 2
-        else:
-            i += 1
-    
-    run_server(port, expected_api_key) 
\ No newline at end of file
+    return ServerConfig(port=args.port, api_key=args.api_key, max_workers=args.workers, processes=processes)
+
+if __name__ == "__main__":
+    run_server(parse_args())
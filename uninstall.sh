@@ -49,6 +49,7 @@ systemctl daemon-reload
 print_status "Removing installed files..."
 rm -f /usr/local/bin/rfid_reader.py
 rm -f /usr/local/bin/db_manager.py
+rm -f /usr/local/bin/db_schema.py
 
 # Remove configuration directory (ask user first)
 if [ -d "/etc/rfid_reader" ]; then
@@ -64,11 +65,11 @@ fi
 
 # Remove log file (ask user first)
 if [ -f "/var/log/rfid_reader.log" ]; then
-    print_warning "Do you want to remove the log file (/var/log/rfid_reader.log)? (y/N)"
+    print_warning "Do you want to remove the log files (/var/log/rfid_reader.log*)? (y/N)"
     read -r response
     if [[ "$response" =~ ^[Yy]$ ]]; then
-        rm -f /var/log/rfid_reader.log
-        print_status "Log file removed"
+        rm -f /var/log/rfid_reader.log /var/log/rfid_reader.log.[0-9]
+        print_status "Log files removed"
     else
         print_status "Log file kept at /var/log/rfid_reader.log"
     fi